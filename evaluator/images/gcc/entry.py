@@ -29,6 +29,9 @@ def cmd_run(cmd, out, show_cmd=None, env=None):
         return p.returncode
 
 
+MAX_SOURCE_ARGS = 8
+RESPONSE_FILE = "/tmp/sources.rsp"
+
 output = os.getenv("PIPE_OUTPUT", "main")
 flags = os.getenv("PIPE_FLAGS", "")
 ldflags = os.getenv("PIPE_LDFLAGS", "")
@@ -60,7 +63,7 @@ with open("result.html", "w") as out:
         sources = []
         for root, dirs, files in os.walk("."):
             for f in files:
-                if f.split(".")[-1] in ["c", "cpp"]:
+                if f.endswith((".c", ".cpp")):
                     sources.append(os.path.join(root, f))
 
         if not sources:
@@ -78,7 +81,13 @@ with open("result.html", "w") as out:
             *shlex.split(flags),
             *shlex.split(ldflags),
         ]
-        returncode = cmd_run(compile_cmd, out, show_cmd=compile_cmd, env=env)
+        run_cmd = compile_cmd
+        # pass long lists of sources in a response file instead of the command line
+        if len(sources) > MAX_SOURCE_ARGS:
+            with open(RESPONSE_FILE, "w") as f:
+                f.write("\n".join(shlex.quote(source) for source in sources))
+            run_cmd = [compile_cmd[0], f"@{RESPONSE_FILE}", *compile_cmd[1 + len(sources) :]]
+        returncode = cmd_run(run_cmd, out, show_cmd=compile_cmd, env=env)
 
         if returncode == 0:
             out.write("<div style='color: green'>Compilation Succeeded</div>")
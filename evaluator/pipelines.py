@@ -1,19 +1,25 @@
+import contextlib
 import json
 import os
 import io
+import pathlib
 import subprocess
 import tempfile
 import shlex
 import hashlib
+import itertools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from common.utils import points_to_color
 from .results import TestResult
-from . import testsets
+from . import testsets, runner
 
-from .utils import parse_human_size, copyfile
+from .utils import parse_human_size, copyfile, files_equal
 
 logger = logging.getLogger("evaluator")
 
+RUNNER_SOURCE = pathlib.Path(runner.__file__).read_text()
+
 DEFAULT_LIMITS = {"fsize": "16M", "memory": "128M", "network": "none"}
 
 IMAGE_LIMITS = {
@@ -107,14 +113,29 @@ class ImageNotFoundException(Exception):
     pass
 
 
+def image_id(name):
+    p = subprocess.run(
+        ["docker", "image", "inspect", "--format", "{{.Id}}", name],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    return p.stdout.strip() if p.returncode == 0 else None
+
+
 def prepare_container(name, before=None):
     if not before:
         return name
 
-    hash = hashlib.md5((name + "\n".join(before)).encode("utf-8")).hexdigest()
+    # the image is identified by its base image, so it is rebuilt when the base changes
+    base_id = image_id(name) or name
+    hash = hashlib.md5((base_id + "\n".join(before)).encode("utf-8")).hexdigest()
     base_name = name.split(":")[0]
     target_name = f"{base_name}:{hash}"
 
+    if image_id(target_name):
+        return target_name
+
     instructions = [f"FROM {name}"] + [f"RUN {cmd}" for cmd in before]
 
     logging.warning(f"Building image {target_name}")
@@ -220,52 +241,69 @@ def with_nl_message(diff: str):
 
 
 def text_compare(expected, actual):
-    def to_file(input):
-        if isinstance(input, io.StringIO):
-            f = tempfile.NamedTemporaryFile(mode="w")
-            f.write(input.getvalue())
-            return f.name
-        return input
+    with contextlib.ExitStack() as stack:
+
+        def to_file(input):
+            if isinstance(input, io.StringIO):
+                # missing files are compared as empty ones
+                if not input.getvalue():
+                    return os.devnull
+                f = stack.enter_context(tempfile.NamedTemporaryFile(mode="w"))
+                f.write(input.getvalue())
+                f.flush()
+                return f.name
+            return input
 
-    try:
-        expected = to_file(expected)
-        actual = to_file(actual)
-
-        cmd = [
-            "diff",
-            "-a",
-            "-u",
-            # "-i",
-            # "-w",
-            # '-B',
-            actual,
-            expected,
-        ]
-
-        with tempfile.TemporaryFile() as out:
-            p = subprocess.Popen(cmd, stdout=out)
-            p.communicate()
+        try:
+            return diff_files(to_file(expected), to_file(actual))
+        except UnicodeDecodeError as e:
+            return False, str(e), None
+
+
+def diff_files(expected, actual):
+    # diff is only needed to show the differences
+    if files_equal(expected, actual):
+        return True, None, ""
+
+    cmd = [
+        "diff",
+        "-a",
+        "-u",
+        # "-i",
+        # "-w",
+        # '-B',
+        actual,
+        expected,
+    ]
 
-            success = p.returncode == 0
+    with tempfile.TemporaryFile() as out:
+        p = subprocess.Popen(cmd, stdout=out)
+        p.communicate()
 
-            out.seek(0)
-            diff = out.read().decode("utf-8")
-            diff = with_nl_message(diff)
-            return success, None, diff
-    except UnicodeDecodeError as e:
-        return False, str(e), None
+        success = p.returncode == 0
+
+        out.seek(0)
+        diff = out.read().decode("utf-8")
+        diff = with_nl_message(diff)
+        return success, None, diff
+
+
+def has_extra_files(test):
+    return any(path not in ("stdin", "stdout", "stderr") for path in test.files)
 
 
 class TestsPipe:
-    def __init__(self, executable="./main", limits=None, timeout=5, before=None, **kwargs):
+    def __init__(
+        self, executable="./main", limits=None, timeout=5, before=None, parallel=1, **kwargs
+    ):
         super().__init__(**kwargs)
         self.executable = [executable] if isinstance(executable, str) else executable
         self.limits = limits
         self.timeout = timeout
+        self.parallel = max(1, int(parallel))
         self.before = [] if not before else before
 
     def run(self, evaluation):
-        results = []
         result_dir = os.path.join(evaluation.result_path, self.id)
         os.mkdir(result_dir)
 
@@ -283,140 +321,188 @@ class TestsPipe:
             .decode("utf-8")
             .strip()
         )
-        for test in evaluation.tests:
-            result = TestResult(result_dir, {"name": test.name})
-
-            # copy input files to the sandbox
-            for path, f in test.files.items():
-                if f.input:
-                    copyfile(f.path, os.path.join(evaluation.submit_path, path))
-
-            args = {}
-            comm_args = {}
-            have_file_stdin = False
-            if test.stdin:
-                stdin = test.stdin.open()
-                if isinstance(stdin, io.StringIO):
-                    comm_args["input"] = stdin.getvalue().encode("utf-8")
-                    args["stdin"] = subprocess.PIPE
-                else:
-                    args["stdin"] = stdin
-                    have_file_stdin = True
-                result.copy_result_file("stdin", actual=test.stdin.file.path)
-
-            # run process in the sandbox
-            cmd = self.executable + test.args
-
-            with (
-                tempfile.NamedTemporaryFile() as stdout_name,
-                tempfile.NamedTemporaryFile() as stderr_name,
-            ):
-                docker_cmd = ["docker", "exec", "-i", container, "timeout", str(self.timeout)] + cmd
-                logger.debug(
-                    "executing in isolation: %s", " ".join(docker_cmd)
-                )  # TODO: shlex.join only in python3.8
-
-                def preexec_fn():
-                    import resource
-
-                    fsize = parse_human_size(DEFAULT_LIMITS["fsize"])
-                    resource.setrlimit(resource.RLIMIT_FSIZE, (fsize, fsize))
-
-                p = subprocess.Popen(
-                    docker_cmd,
-                    **args,
-                    stdout=stdout_name,
-                    stderr=stderr_name,
-                    preexec_fn=preexec_fn,
-                )
-                p.communicate(**comm_args)
+        tests = list(evaluation.tests)
+        # expected files already copied to the result directory
+        copies = {}
 
-                timeouted = p.returncode == 124 and test.exit_code != 124
-                result["exit_code"] = p.returncode
+        def execute(batch):
+            return self.run_batch(evaluation, container, result_dir, batch, copies)
 
-                if have_file_stdin:
-                    args["stdin"].close()
+        # tests are executed in their order, consecutive stdin/stdout tests are batched
+        results = []
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            for has_files, group in itertools.groupby(tests, key=has_extra_files):
+                group = list(group)
+                if has_files:
+                    # tests with their own input/output files need the working directory
+                    # for themselves, so they are executed one by one with nothing else running
+                    for test in group:
+                        results += execute([test])
+                else:
+                    size = -(-len(group) // self.parallel)
+                    batches = [group[i : i + size] for i in range(0, len(group), size)]
+                    for batch_results in executor.map(execute, batches):
+                        results += batch_results
 
-                # copy all result and expected files
-                result.copy_result_file("stdout", actual=stdout_name.name, expected=test.stdout)
-                result.copy_result_file("stderr", actual=stderr_name.name, expected=test.stderr)
-                for path, expected in test.files.items():
-                    if path in ["stdout", "stderr"]:
-                        continue
+        # the container only runs sleep, there is nothing to shut down gracefully
+        subprocess.Popen(["docker", "kill", container], stdout=subprocess.DEVNULL)
 
-                    if expected.input:
-                        result.copy_input_file(path, expected)
-                    else:
-                        result.copy_result_file(
-                            path,
-                            actual=os.path.join(evaluation.submit_path, path),
-                            expected=expected,
-                        )
-
-            # do a comparsion
-            for name, opts in result.files.items():
-                if "expected" not in opts:
-                    continue
-
-                msg = None
-                if "actual" not in opts:
-                    opts["error"] = "file not found"
-                    msg = f"file <strong>{name}</strong> not found"
-                    if name == "stdout":
-                        msg = "Standard output (<strong>stdout</strong>) is empty"
-                    elif name == "stderr":
-                        msg = "Standard error (<strong>stderr</strong>) is empty. Did you mean to use this?<pre><code class='c'>fprintf(stderr, \"message\\n\");</code></pre>"
+        return {
+            "tests": results,
+        }
 
-                    opts["actual"] = testsets.TestFile(testsets.File(io.StringIO()))
-
-                success, output, diff = text_compare(opts["expected"].path, opts["actual"].path)
-                if output:
-                    result.copy_html_result(name, output)
-                if diff:
-                    result.copy_diff(name, diff)
-
-                if not msg:
-                    msg = f"file <strong>{name}</strong> doesn't match"
-                    if name == "stdout":
-                        msg = "Standard output (<strong>stdout</strong>) doesn't match"
-                    elif name == "stderr":
-                        if opts["actual"].size() <= 0:
-                            msg = "Standard error (<strong>stderr</strong>) is empty. Did you mean to use this?<pre><code class='c'>fprintf(stderr, \"message\\n\");</code></pre>"
-                        else:
-                            msg = "Standard error (<strong>stderr</strong>) doesn't match"
-                result.add_result(success, msg, output)
-
-            if timeouted:
-                result.add_result(
-                    success=False,
-                    message=f"<strong>The test has timeouted after {self.timeout}s</strong>. Make sure that you do not use e.g. `sleep` in your program.",
-                )
-            elif test.exit_code is not None:
-                result.add_result(
-                    test.exit_code == result["exit_code"],
-                    f"<strong>main</strong> or <strong>exit</strong> function terminated the program with exit status <strong>{result['exit_code']}</strong> instead of <strong>{test.exit_code}</strong>",
+    def run_batch(self, evaluation, container, result_dir, tests, copies=None):
+        """
+        Executes all tests with a single `docker exec` of the runner script
+        and evaluates their results.
+        """
+        results = []
+        command = ["timeout", str(self.timeout), *self.executable]
+
+        with (
+            tempfile.TemporaryFile() as requests,
+            tempfile.NamedTemporaryFile() as runner_stderr,
+        ):
+            for test in tests:
+                result = TestResult(result_dir, {"name": test.name})
+                results.append(result)
+
+                # copy input files to the sandbox
+                for path, f in test.files.items():
+                    if f.input:
+                        copyfile(f.path, os.path.join(evaluation.submit_path, path))
+
+                stdin = None
+                if test.stdin:
+                    stdin = test.stdin.read("rb")
+                    result.copy_result_file("stdin", actual=test.stdin.file.path)
+
+                runner.write_request(requests, command + test.args, stdin)
+            requests.seek(0)
+
+            # run processes in the sandbox
+            docker_cmd = ["docker", "exec", "-i", container, "python3", "-c", RUNNER_SOURCE]
+            logger.debug("executing %d test(s) in isolation", len(tests))
+
+            # outputs are streamed directly to their place in the result directory
+            outputs = []
+            p = subprocess.Popen(
+                docker_cmd, stdin=requests, stdout=subprocess.PIPE, stderr=runner_stderr
+            )
+            with p.stdout:
+                try:
+                    for result in results:
+                        header = runner.read_header(p.stdout)
+                        if header is None:
+                            break
+
+                        paths = []
+                        for stream in ["stdout", "stderr"]:
+                            path = result.result_file_path(stream)
+                            with open(path, "wb") as f:
+                                runner.copy_bytes(p.stdout, f, header[stream])
+                            paths.append(path)
+                        outputs.append((header["exit_code"], *paths))
+                except EOFError:
+                    pass
+            p.wait()
+
+            # the runner has failed, report its error in the remaining tests
+            for result in results[len(outputs) :]:
+                for stream in ["stdout", "stderr"]:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(result.result_file_path(stream))
+                outputs.append((p.returncode, os.devnull, runner_stderr.name))
+
+            for test, result, (exit_code, stdout, stderr) in zip(tests, results, outputs):
+                self.evaluate_test(evaluation, test, result, exit_code, stdout, stderr, copies)
+
+        return results
+
+    def evaluate_test(self, evaluation, test, result, exit_code, stdout, stderr, copies=None):
+        cmd = self.executable + test.args
+        have_file_stdin = test.stdin and not isinstance(test.stdin.path, io.BytesIO)
+
+        timeouted = exit_code == 124 and test.exit_code != 124
+        result["exit_code"] = exit_code
+
+        # copy all result and expected files
+        result.copy_result_file("stdout", actual=stdout, expected=test.stdout, copies=copies)
+        result.copy_result_file("stderr", actual=stderr, expected=test.stderr, copies=copies)
+        for path, expected in test.files.items():
+            if path in ("stdout", "stderr"):
+                continue
+
+            if expected.input:
+                result.copy_input_file(path, expected)
+            else:
+                result.copy_result_file(
+                    path,
+                    actual=os.path.join(evaluation.submit_path, path),
+                    expected=expected,
+                    copies=copies,
                 )
 
-            # save issued commandline
-            result["command"] = " ".join(cmd)
-            if have_file_stdin:
-                result["command"] += f" < {shlex.quote(os.path.basename(test.stdin.path))}"
+        # do a comparsion
+        for name, opts in result.files.items():
+            if "expected" not in opts:
+                continue
+
+            msg = None
+            if "actual" not in opts:
+                opts["error"] = "file not found"
+                msg = f"file <strong>{name}</strong> not found"
+                if name == "stdout":
+                    msg = "Standard output (<strong>stdout</strong>) is empty"
+                elif name == "stderr":
+                    msg = "Standard error (<strong>stderr</strong>) is empty. Did you mean to use this?<pre><code class='c'>fprintf(stderr, \"message\\n\");</code></pre>"
+
+                opts["actual"] = testsets.TestFile(testsets.File(io.StringIO()))
+
+            success, output, diff = text_compare(opts["expected"].path, opts["actual"].path)
+            # a missing file fails even when the expected one is empty
+            success = success and "error" not in opts
+            if output:
+                result.copy_html_result(name, output)
+            if diff:
+                result.copy_diff(name, diff)
+
+            if not msg:
+                msg = f"file <strong>{name}</strong> doesn't match"
+                if name == "stdout":
+                    msg = "Standard output (<strong>stdout</strong>) doesn't match"
+                elif name == "stderr":
+                    if opts["actual"].size() <= 0:
+                        msg = "Standard error (<strong>stderr</strong>) is empty. Did you mean to use this?<pre><code class='c'>fprintf(stderr, \"message\\n\");</code></pre>"
+                    else:
+                        msg = "Standard error (<strong>stderr</strong>) doesn't match"
+            result.add_result(success, msg, output)
 
-            # run custom evaluation script
-            if test.script:
-                check = getattr(test.script, "check", None)
-                if check:
-                    custom_result = check(result, self)
-                    if custom_result:
-                        result.add_error(custom_result)
+        if timeouted:
+            result.add_result(
+                success=False,
+                message=f"<strong>The test has timeouted after {self.timeout}s</strong>. Make sure that you do not use e.g. `sleep` in your program.",
+            )
+        elif test.exit_code is not None:
+            result.add_result(
+                test.exit_code == result["exit_code"],
+                f"<strong>main</strong> or <strong>exit</strong> function terminated the program with exit status <strong>{result['exit_code']}</strong> instead of <strong>{test.exit_code}</strong>",
+            )
 
-            results.append(result)
+        # save issued commandline
+        result["command"] = " ".join(cmd)
+        if have_file_stdin:
+            result["command"] += f" < {shlex.quote(os.path.basename(test.stdin.path))}"
 
-        subprocess.Popen(["docker", "stop", container])
+        # run custom evaluation script
+        if test.script:
+            check = getattr(test.script, "check", None)
+            if check:
+                custom_result = check(result, self)
+                if custom_result:
+                    result.add_error(custom_result)
 
-        return {
-            "tests": results,
-        }
+        return result
 
 
 class SleepPipe:
@@ -1,12 +1,14 @@
 import os
 import json
-import shutil
 import re
 import io
 
 from .testsets import File, TestFile
 from .utils import copyfile
 
+# <test>.[file_in.|html.|diff.]<file>[.expected]
+RESULT_FILE_RE = re.compile(r"^(?:(?:file_in|html|diff)\.)?(.*?)(?:\.expected)?$", re.S)
+
 
 def encode_json(o):
     if isinstance(o, TestResult):
@@ -25,6 +27,11 @@ class TestResult:
         self.result_dir = result_dir
 
         self.aliases = {"stdin": "in", "stdout": "out", "stderr": "err"}
+        # all files of the test are stored as <result_dir>/<test name>.<suffix>
+        self.path_prefix = os.path.join(result_dir, f"{self.meta.get('name')}.")
+
+    def file_path(self, suffix):
+        return self.path_prefix + suffix
 
     @property
     def files_sorted(self):
@@ -33,14 +40,14 @@ class TestResult:
     def discover_files(self):
         aliases = {v: k for k, v in self.aliases.items()}
 
+        prefix = f"{self['name']}."
         try:
             for file in os.listdir(self.result_dir):
-                if not file.startswith(f"{self['name']}."):
+                if not file.startswith(prefix):
                     continue
 
-                n = file[len(self["name"]) + 1 :]
-                base = re.sub(r"\.expected$", "", n)
-                base = re.sub(r"^(file_in|html|diff)\.", "", base)
+                n = file[len(prefix) :]
+                base = RESULT_FILE_RE.match(n).group(1)
                 base = aliases.get(base, base)
 
                 if base not in self.files:
@@ -67,48 +74,77 @@ class TestResult:
         else:
             dst = f"file_in.{local_name}"
 
-        copyfile(real_file.path, os.path.join(self.result_dir, f"{self['name']}.{dst}"))
+        copyfile(real_file.path, self.file_path(dst))
 
     def copy_html_result(self, name, content):
-        with open(os.path.join(self.result_dir, f"{self['name']}.html.{name}"), "w") as f:
+        with open(self.file_path(f"html.{name}"), "w") as f:
             f.write(content)
 
     def copy_diff(self, name, content):
-        with open(os.path.join(self.result_dir, f"{self['name']}.diff.{name}"), "w") as f:
+        with open(self.file_path(f"diff.{name}"), "w") as f:
             f.write(content)
 
-    def copy_result_file(self, name, expected=None, actual=None, force_save=False):
+    def result_file_path(self, name):
+        return self.file_path(self.aliases.get(name, name))
+
+    def copy_expected_file(self, src, dest, copies):
+        """
+        Copies an expected file to the result directory. Tests sharing an expected file
+        hard-link to the copy made for the first of them, so all their copies share one inode.
+        Expected files in the result directory must therefore never be written to,
+        replace them with a new file instead.
+        """
+        if copies is not None and src in copies:
+            try:
+                os.link(copies[src], dest)
+                return
+            except OSError:
+                pass
+
+        copyfile(src, dest)
+        if copies is not None:
+            copies.setdefault(src, dest)
+
+    def copy_result_file(self, name, expected=None, actual=None, force_save=False, copies=None):
         ext = self.aliases.get(name, name)
 
         if expected:
-            copyfile(expected.path, os.path.join(self.result_dir, f"{self['name']}.{ext}.expected"))
+            self.copy_expected_file(
+                expected.path,
+                self.file_path(f"{ext}.expected"),
+                copies,
+            )
 
         if actual:
             try:
                 if isinstance(actual, File):
                     actual = actual.path
 
-                dest = os.path.join(self.result_dir, f"{self['name']}.{ext}")
+                dest = self.result_file_path(name)
                 if isinstance(actual, io.StringIO) or isinstance(actual, io.BytesIO):
                     with open(dest, "w" if isinstance(actual, io.StringIO) else "wb") as f:
                         f.write(actual.getvalue())
+                elif actual == dest:
+                    # the file has been written directly to the result directory
+                    if os.stat(dest).st_size == 0 and not expected:
+                        os.unlink(dest)
                 elif os.stat(actual).st_size > 0 or expected:
-                    shutil.copyfile(actual, dest)
+                    copyfile(actual, dest)
             except FileNotFoundError:
                 pass
 
         self.add_existing_file(name)
 
     def add_existing_file(self, name, error=None, type=None):
-        self.files_cache = os.listdir(self.result_dir)
         result = {}
 
-        def add_if_exists(key, real_name):
-            if real_name in self.files_cache:
-                result[key] = File(os.path.join(self.result_dir, real_name))
+        def add_if_exists(key, path):
+            if os.path.exists(path):
+                result[key] = File(path)
 
-        add_if_exists("expected", f"{self['name']}.{self.aliases.get(name, name)}.expected")
-        add_if_exists("actual", f"{self['name']}.{self.aliases.get(name, name)}")
+        path = self.result_file_path(name)
+        add_if_exists("expected", f"{path}.expected")
+        add_if_exists("actual", path)
 
         if error:
             result["error"] = error
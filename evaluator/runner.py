@@ -0,0 +1,125 @@
+"""
+Executes a batch of tests inside the evaluation container with a single `docker exec`.
+
+The script is passed to `python3 -c` in the container, so it must only use the standard library.
+Each test is described on the standard input by a JSON header line followed by the content
+of its standard input. For each test, a JSON header line with the exit code and the sizes
+of the captured outputs is written to the standard output, followed by the captured
+stdout and stderr.
+"""
+
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_request(stream, cmd, stdin=None):
+    header = {"cmd": cmd, "stdin": None if stdin is None else len(stdin)}
+    stream.write(json.dumps(header).encode("utf-8") + b"\n")
+    if stdin is not None:
+        stream.write(stdin)
+
+
+def read_header(stream):
+    header = stream.readline()
+    if not header:
+        return None
+    return json.loads(header)
+
+
+def copy_bytes(src, dst, size):
+    while size > 0:
+        chunk = src.read(min(size, CHUNK_SIZE))
+        if not chunk:
+            raise EOFError("unexpected end of the runner output")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def exit_code(returncode):
+    # report processes killed by a signal in the same way as a shell or `docker exec`
+    if returncode < 0:
+        return 128 - returncode
+    return returncode
+
+
+def skip_bytes(src, size):
+    while size > 0:
+        chunk = src.read(min(size, CHUNK_SIZE))
+        if not chunk:
+            raise EOFError("unexpected end of the runner input")
+        size -= len(chunk)
+
+
+def feed_stdin(requests, pipe, size):
+    try:
+        while size > 0:
+            chunk = requests.read(min(size, CHUNK_SIZE))
+            if not chunk:
+                raise EOFError("unexpected end of the runner input")
+            size -= len(chunk)
+            pipe.write(chunk)
+        pipe.close()
+    except BrokenPipeError:
+        # the process did not read its whole input, skip the rest to keep the requests in sync
+        skip_bytes(requests, size)
+        with contextlib.suppress(BrokenPipeError):
+            pipe.close()
+
+
+def run_test(requests, header, stdout, stderr):
+    # the input is piped instead of stored in a file, so it is not limited by the fsize limit
+    stdin_size = header["stdin"]
+    try:
+        p = subprocess.Popen(
+            header["cmd"],
+            stdin=subprocess.PIPE if stdin_size is not None else subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+        )
+    except Exception as e:
+        if stdin_size is not None:
+            skip_bytes(requests, stdin_size)
+        stderr.write(f"{e}\n".encode("utf-8"))
+        stderr.flush()
+        return 127
+
+    if stdin_size is not None:
+        feed_stdin(requests, p.stdin, stdin_size)
+    return exit_code(p.wait())
+
+
+def main():
+    requests = sys.stdin.buffer
+    results = sys.stdout.buffer
+
+    while True:
+        header = read_header(requests)
+        if header is None:
+            break
+
+        with (
+            tempfile.TemporaryFile() as stdout,
+            tempfile.TemporaryFile() as stderr,
+        ):
+            code = run_test(requests, header, stdout, stderr)
+
+            result = {
+                "exit_code": code,
+                "stdout": os.fstat(stdout.fileno()).st_size,
+                "stderr": os.fstat(stderr.fileno()).st_size,
+            }
+            results.write(json.dumps(result).encode("utf-8") + b"\n")
+            for name, f in (("stdout", stdout), ("stderr", stderr)):
+                f.seek(0)
+                copy_bytes(f, results, result[name])
+            results.flush()
+
+
+if __name__ == "__main__":
+    main()
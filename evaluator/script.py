@@ -1,5 +1,7 @@
 import importlib.util
 import contextlib
+import functools
+import hashlib
 import traceback
 import os
 import sys
@@ -16,6 +18,15 @@ def change_cwd(new_cwd):
         os.chdir(current)
 
 
+@functools.lru_cache(maxsize=256)
+def compile_script(path, mtime, size):
+    """
+    Compiles the script, the code is reused until the file is modified.
+    """
+    with open(path, "rb") as f:
+        return compile(f.read(), path, "exec")
+
+
 class Script:
     def __init__(self, task_path, meta, output_fn, filename="script.py"):
         self.task_path = task_path
@@ -26,18 +37,18 @@ class Script:
         self.load_module()
 
     def load_module(self):
-        module_name = "xyz"
+        path = os.path.join(self.task_path, self.filename)
+        module_name = f"kelvin_script_{hashlib.md5(path.encode('utf-8')).hexdigest()}"
 
-        spec = importlib.util.spec_from_file_location(
-            module_name, os.path.join(self.task_path, self.filename)
-        )
+        spec = importlib.util.spec_from_file_location(module_name, path)
         self.module = importlib.util.module_from_spec(spec)
         self.module.login = self.meta.get("login", None)
         self.module.meta = self.meta
         sys.modules[module_name] = self.module
 
         with self.sandbox_run():
-            spec.loader.exec_module(self.module)
+            stat = os.stat(path)
+            exec(compile_script(path, stat.st_mtime_ns, stat.st_size), self.module.__dict__)
 
     def call(self, fn_name, *kargs, **kwargs):
         with self.sandbox_run():
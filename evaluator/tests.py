@@ -1,5 +1,14 @@
+import io
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
-from .utils import parse_human_size
+from . import runner
+from .script import Script
+from .utils import parse_human_size, load_yaml, files_equal, copyfile
 
 
 class TestUtils(unittest.TestCase):
@@ -17,6 +26,133 @@ class TestUtils(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.assertEqual(parse_human_size("1.5Z"), 1.5 * 1024 * 1024)
 
+    def test_load_yaml(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.yml")
+            with open(path, "w") as f:
+                f.write("pipeline:\n  - type: gcc\n")
+
+            conf = load_yaml(path)
+            self.assertEqual(conf, {"pipeline": [{"type": "gcc"}]})
+            conf["pipeline"].append({"type": "tests"})
+            self.assertEqual(load_yaml(path), {"pipeline": [{"type": "gcc"}]})
+
+            with open(path, "w") as f:
+                f.write("timeout: 60\n")
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(load_yaml(path), {"timeout": 60})
+
+    def test_files_equal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+
+            def write(name, content):
+                path = os.path.join(tmp, name)
+                with open(path, "wb") as f:
+                    f.write(content)
+                return path
+
+            a = write("a", b"1 2 3\n" * 1000)
+            self.assertTrue(files_equal(a, write("b", b"1 2 3\n" * 1000), chunk_size=7))
+            self.assertFalse(files_equal(a, write("c", b"1 2 3\n" * 999 + b"1 2 4\n")))
+            self.assertFalse(files_equal(a, write("d", b"1 2 3\n" * 999)))
+            self.assertTrue(files_equal(write("e", b""), write("f", b"")))
+
+    def test_copyfile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src")
+            dst = os.path.join(tmp, "dst")
+            with open(src, "wb") as f:
+                f.write(b"data\n" * 1000)
+            with open(dst, "wb") as f:
+                f.write(b"previous content" * 1000)
+
+            copyfile(src, dst)
+            self.assertTrue(files_equal(src, dst))
+
+            copyfile(io.BytesIO(b"memory"), dst)
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read(), b"memory")
+
+            with self.assertRaises(shutil.SameFileError):
+                copyfile(src, src)
+            self.assertEqual(os.path.getsize(src), 5000)
+
+
+class TestScript(unittest.TestCase):
+    def test_meta(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "script.py"), "w") as f:
+                f.write("def greet():\n    return f'hello {login}'\n")
+
+            output = []
+            first = Script(tmp, {"login": "abc0123"}, output.append)
+            second = Script(tmp, {"login": "xyz0123"}, output.append)
+
+            self.assertEqual(first.call("greet"), "hello abc0123")
+            self.assertEqual(second.call("greet"), "hello xyz0123")
+            self.assertEqual(output, [])
+
+
+class TestRunner(unittest.TestCase):
+    def run_runner(self, requests, preexec_fn=None):
+        p = subprocess.run(
+            [sys.executable, runner.__file__],
+            input=requests.getvalue(),
+            capture_output=True,
+            preexec_fn=preexec_fn,
+        )
+        self.assertEqual(p.returncode, 0, p.stderr)
+        results = io.BytesIO(p.stdout)
+
+        def read_result():
+            header = runner.read_header(results)
+            if header is None:
+                return None
+            return (
+                header["exit_code"],
+                results.read(header["stdout"]),
+                results.read(header["stderr"]),
+            )
+
+        return list(iter(read_result, None))
+
+    def test_batch(self):
+        requests = io.BytesIO()
+        runner.write_request(requests, ["cat"], b"hello")
+        runner.write_request(requests, ["sh", "-c", "echo err >&2; exit 3"])
+        runner.write_request(requests, ["sh", "-c", "kill -9 $$"])
+
+        self.assertEqual(
+            self.run_runner(requests),
+            [(0, b"hello", b""), (3, b"", b"err\n"), (137, b"", b"")],
+        )
+
+    def test_stdin_over_fsize_limit(self):
+        limit = 1024 * 1024
+        requests = io.BytesIO()
+        runner.write_request(requests, ["wc", "-c"], b"x" * (2 * limit))
+        runner.write_request(requests, ["head", "-c", "1"], b"y" * (2 * limit))
+        runner.write_request(requests, ["cat"], b"hello")
+
+        def set_limit():
+            resource.setrlimit(resource.RLIMIT_FSIZE, (limit, limit))
+
+        self.assertEqual(
+            self.run_runner(requests, preexec_fn=set_limit),
+            [(0, f"{2 * limit}\n".encode(), b""), (0, b"y", b""), (0, b"hello", b"")],
+        )
+
+    def test_failed_request(self):
+        requests = io.BytesIO()
+        runner.write_request(requests, ["/nonexistent/program"], b"input")
+        runner.write_request(requests, ["cat"], b"hello")
+
+        results = self.run_runner(requests)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][:2], (127, b""))
+        self.assertIn(b"/nonexistent/program", results[0][2])
+        self.assertEqual(results[1], (0, b"hello", b""))
+
 
 if __name__ == "__main__":
     unittest.main()
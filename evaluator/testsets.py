@@ -7,9 +7,12 @@ import traceback
 import yaml
 
 from .script import Script
+from .utils import load_yaml
 from web.task_utils import load_readme
 from kelvin.settings import BASE_DIR
 
+PIPE_TYPE_SEPARATOR_RE = re.compile("_|-")
+
 
 class File:
     def __init__(self, path):
@@ -45,21 +48,15 @@ class Test:
 
     @property
     def stdin(self):
-        if "stdin" not in self.files:
-            return None
-        return self.files["stdin"]
+        return self.files.get("stdin")
 
     @property
     def stdout(self):
-        if "stdout" not in self.files:
-            return None
-        return self.files["stdout"]
+        return self.files.get("stdout")
 
     @property
     def stderr(self):
-        if "stderr" not in self.files:
-            return None
-        return self.files["stderr"]
+        return self.files.get("stderr")
 
     @property
     def escaped_args(self):
@@ -145,7 +142,7 @@ class TestSet:
         self.pipeline = []
 
         self.script = None
-        if os.path.exists(os.path.join(self.task_path, "script.py")):
+        if "script.py" in self.files_cache:
             try:
                 self.script = Script(self.task_path, self.meta, self.add_warning)
             except Exception as e:
@@ -179,16 +176,13 @@ class TestSet:
             n = f[len(name) + 1 :]
             if n in ["in", "out", "err"]:
                 self.create_test(name).files["std" + n] = TestFile(File(path), n == "in")
+                continue
 
             parts = n.split(".", 1)
             if parts[0] == "file_in":
-                self.create_test(name).files[parts[1]] = TestFile(
-                    File(os.path.join(self.task_path, f)), True
-                )
+                self.create_test(name).files[parts[1]] = TestFile(File(path), True)
             elif parts[0] == "file_out":
-                self.create_test(name).files[parts[1]] = TestFile(
-                    File(os.path.join(self.task_path, f)), False
-                )
+                self.create_test(name).files[parts[1]] = TestFile(File(path), False)
 
     def add_warning(self, message):
         self.warnings.append(message)
@@ -203,7 +197,9 @@ class TestSet:
             for item in conf:
                 try:
                     pipe_type = item["type"]
-                    class_name = "".join([p.title() for p in re.split("_|-", item["type"])])
+                    class_name = "".join(
+                        [p.title() for p in PIPE_TYPE_SEPARATOR_RE.split(pipe_type)]
+                    )
                     pipecls = getattr(pipelines, f"{class_name}Pipe", None)
                     if not pipecls and self.script:
                         pipecls = getattr(self.script.module, f"{class_name}Pipe", None)
@@ -261,7 +257,9 @@ class TestSet:
     def load_tests(self):
         self.discover_tests()
 
-        def process_file(fn):
+        def process_file(filename, fn):
+            if filename not in self.files_cache:
+                return
             try:
                 fn()
             except yaml.scanner.ScannerError as e:
@@ -270,24 +268,22 @@ class TestSet:
                 pass
 
         def load_config_yaml():
-            with open(os.path.join(self.task_path, "config.yml")) as f:
-                conf = yaml.load(f.read(), Loader=yaml.SafeLoader)
-                if conf:
-                    for key, value in conf.items():
-                        fn = getattr(self, f"parse_conf_{key}", None)
-                        if not fn:
-                            self.add_warning(f"Unknown configuration key: {key}")
-                        else:
-                            fn(value)
+            conf = load_yaml(os.path.join(self.task_path, "config.yml"))
+            if conf:
+                for key, value in conf.items():
+                    fn = getattr(self, f"parse_conf_{key}", None)
+                    if not fn:
+                        self.add_warning(f"Unknown configuration key: {key}")
+                    else:
+                        fn(value)
 
         def load_tests_yaml():
-            with open(os.path.join(self.task_path, "tests.yml")) as f:
-                tests = yaml.load(f.read(), Loader=yaml.SafeLoader)
-                if tests:
-                    self.parse_conf_tests(tests)
+            tests = load_yaml(os.path.join(self.task_path, "tests.yml"))
+            if tests:
+                self.parse_conf_tests(tests)
 
-        process_file(load_config_yaml)
-        process_file(load_tests_yaml)
+        process_file("config.yml", load_config_yaml)
+        process_file("tests.yml", load_tests_yaml)
 
         if self.script:
             self.script.call("gen_tests", self)
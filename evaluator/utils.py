@@ -1,10 +1,18 @@
+import copy
+import functools
 import io
+import os
 import shutil
 import re
 
+import yaml
+
+COPY_CHUNK_SIZE = 1024 * 1024 * 1024
+HUMAN_SIZE_RE = re.compile(r"^([0-9]+(\.[0-9]+)?)\s*(K|M|G|T)?B?$")
+
 
 def parse_human_size(txt):
-    m = re.match(r"^([0-9]+(\.[0-9]+)?)\s*(K|M|G|T)?B?$", str(txt).strip())
+    m = HUMAN_SIZE_RE.match(str(txt).strip())
     if not m:
         raise ValueError(f"Invalid size: {txt}")
 
@@ -21,6 +29,64 @@ def parse_human_size(txt):
 def copyfile(src, dst):
     if isinstance(src, io.BytesIO):
         with open(dst, "wb") as f:
-            f.write(src.getvalue())
-    else:
-        shutil.copyfile(src, dst)
+            f.write(src.getbuffer())
+        return
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            copy_file_range(src, dst)
+            return
+        except OSError:
+            # not supported between these filesystems or for this kind of file
+            pass
+    shutil.copyfile(src, dst)
+
+
+def copy_file_range(src, dst):
+    """
+    Copies the file inside the kernel, filesystems with reflinks share the data instead.
+    """
+    with open(src, "rb") as fsrc:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            src_stat = os.fstat(fsrc.fileno())
+            dst_stat = os.fstat(fd)
+            if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+                raise shutil.SameFileError(f"{src} and {dst} are the same file")
+
+            os.ftruncate(fd, 0)
+            while os.copy_file_range(fsrc.fileno(), fd, COPY_CHUNK_SIZE):
+                pass
+        finally:
+            os.close(fd)
+
+
+def files_equal(a, b, chunk_size=64 * 1024):
+    """
+    Compares content of two files, stops reading at the first difference.
+    """
+    if os.stat(a).st_size != os.stat(b).st_size:
+        return False
+
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            chunk = fa.read(chunk_size)
+            if chunk != fb.read(chunk_size):
+                return False
+            if not chunk:
+                return True
+
+
+def load_yaml(path):
+    """
+    Parses a YAML file, the parsed content is cached until the file is modified.
+    A copy is returned, so the caller is free to modify it.
+    """
+    stat = os.stat(path)
+    return copy.deepcopy(parse_yaml_file(path, stat.st_mtime_ns, stat.st_size))
+
+
+@functools.lru_cache(maxsize=128)
+def parse_yaml_file(path, mtime, size):
+    with open(path) as f:
+        return yaml.load(f.read(), Loader=yaml.SafeLoader)
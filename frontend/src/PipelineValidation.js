@@ -566,7 +566,11 @@ const rules = new DictRule({
         ],
         tests: [
             new DockerPipeRule({
-                executable: new UnionRule(new ValueRule(), new ArrayRule())
+                executable: new UnionRule(new ValueRule(), new ArrayRule()),
+                parallel: [
+                    new ValueRule(),
+                    'Number of tests executed concurrently. By default <strong>1</strong>'
+                ]
             }),
             'Run input/output/files tests on compiled program.'
         ],
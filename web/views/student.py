@@ -57,11 +57,10 @@ mimedetector = magic.Magic(mime=True)
 
 def is_file_small(path):
     def count_lines(path):
-        lines = 0
+        # the file is small enough to be decoded at once
         with open(path) as f:
-            for line in f:
-                lines += 1
-        return lines
+            content = f.read()
+        return content.count("\n") + (1 if content and not content.endswith("\n") else 0)
 
     try:
         return (